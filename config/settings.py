@@ -10,6 +10,8 @@ class Config:
     HF_TOKEN = os.getenv("HF_TOKEN")
     HF_EMBEDDING_MODEL = os.getenv("HF_EMBEDDING_MODEL", "google/embeddinggemma-300m")
     HF_LLM_MODEL = os.getenv("HF_LLM_MODEL", "google/gemma-3-1b-it")
+    HF_EMBEDDING_BACKEND = os.getenv("HF_EMBEDDING_BACKEND", "torch")
+    HF_EMBEDDING_ONNX_FILE = os.getenv("HF_EMBEDDING_ONNX_FILE")
     EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", 768))
     TIKTOKEN_ENCODING_NAME = os.getenv("TIKTOKEN_ENCODING_NAME", "o200k_base")
     POSTGRES_DB_URL = os.getenv("POSTGRES_DB_URL")
\ No newline at end of file
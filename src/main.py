@@ -37,12 +37,14 @@ async def main():
 
     args = parser.parse_args()
 
-    # Initialize embedder
+    vector_store = PostgresVectorStore()
+
+    # Initialize embedder (the vector store doubles as its embedding cache)
     if args.embedding_provider == "openai":
-        embedder = OpenAIEmbedder()
+        embedder = OpenAIEmbedder(cache=vector_store)
         print("Using OpenAI Embedder.")
     else:
-        embedder = HuggingFaceEmbedder()
+        embedder = HuggingFaceEmbedder(cache=vector_store)
         print("Using HuggingFace Embedder.")
 
     # Initialize LLM
@@ -61,8 +63,6 @@ async def main():
         chunker = CharacterChunker()
         print("Using CharacterChunker.")
 
-    vector_store = PostgresVectorStore()
-
     pipeline = RAGPipeline(chunker, embedder, vector_store, llm)
 
     try:
@@ -1,9 +1,19 @@
+import functools
+import hashlib
+import numpy as np
 import tiktoken
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from typing import List, Any, Dict
 from dataclasses import dataclass, field
 
 
+@functools.lru_cache(maxsize=8)
+def get_encoding(encoding_name: str) -> tiktoken.Encoding:
+    """Return a shared tiktoken encoding, loading it once per process."""
+    return tiktoken.get_encoding(encoding_name)
+
+
 @dataclass
 class Document:
     content: str
@@ -14,7 +24,7 @@ class ChunkingStrategy(ABC):
     def __init__(self, chunk_size: int, chunk_overlap: int, encoding_name: str):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        self.encoding = tiktoken.get_encoding(encoding_name)
+        self.encoding = get_encoding(encoding_name)
 
     @abstractmethod
     def chunk(self, document: Document) -> List[Document]:
@@ -22,14 +32,98 @@ class ChunkingStrategy(ABC):
         pass
 
 
+class EmbeddingCache(ABC):
+    @abstractmethod
+    async def get_embeddings(
+        self, hashes: List[bytes], model_name: str, dimensions: int
+    ) -> Dict[bytes, List[float]]:
+        """Fetch cached embeddings keyed by content hash."""
+        pass
+
+    @abstractmethod
+    async def put_embeddings(
+        self,
+        hashes: List[bytes],
+        embeddings: List[List[float]],
+        model_name: str,
+        dimensions: int,
+    ) -> None:
+        """Store embeddings keyed by content hash."""
+        pass
+
+
 class EmbeddingModel(ABC):
-    def __init__(self, model_name: str, dimensions: int = None):
+    def __init__(
+        self,
+        model_name: str,
+        dimensions: int = None,
+        cache: EmbeddingCache = None,
+        memory_cache_size: int = 10000,
+    ):
         self.model_name = model_name
         self.dimensions = dimensions
+        # Identifies the embedding function in cache lookups; subclasses extend
+        # it with anything else that changes the vectors (runtime, weights file)
+        self.cache_key = model_name
+        self.cache = cache
+        self.memory_cache_size = memory_cache_size
+        # Entries are float32 arrays (~3 KB at 768 dims) rather than lists of
+        # Python floats, which would take roughly 8x the memory
+        self._memory_cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
 
-    @abstractmethod
     async def embed(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for a list of texts."""
+        """Generate embeddings for a list of texts, reusing cached results."""
+        hashes = [hashlib.sha256(t.encode("utf-8")).digest() for t in texts]
+        embeddings: List[List[float]] = [None] * len(texts)
+
+        # 1. In-process cache for the current session
+        for i, h in enumerate(hashes):
+            if h in self._memory_cache:
+                self._memory_cache.move_to_end(h)
+                embeddings[i] = self._memory_cache[h].tolist()
+
+        # 2. Persistent cache for the remaining texts
+        missing = [i for i, emb in enumerate(embeddings) if emb is None]
+        if missing and self.cache is not None:
+            cached = await self.cache.get_embeddings(
+                list({hashes[i] for i in missing}), self.cache_key, self.dimensions or 0
+            )
+            for i in missing:
+                if hashes[i] in cached:
+                    embeddings[i] = cached[hashes[i]]
+                    self._remember(hashes[i], embeddings[i])
+            missing = [i for i in missing if embeddings[i] is None]
+
+        # 3. Model call for cache misses only, embedding duplicates once
+        if missing:
+            pending: Dict[bytes, str] = {}
+            for i in missing:
+                pending.setdefault(hashes[i], texts[i])
+            fresh = await self._embed(list(pending.values()))
+            fresh_by_hash = dict(zip(pending, fresh))
+
+            for i in missing:
+                embeddings[i] = fresh_by_hash[hashes[i]]
+            for h, emb in fresh_by_hash.items():
+                self._remember(h, emb)
+
+            if self.cache is not None:
+                await self.cache.put_embeddings(
+                    list(fresh_by_hash), fresh, self.cache_key, self.dimensions or 0
+                )
+
+        return embeddings
+
+    def _remember(self, key: bytes, embedding: List[float]) -> None:
+        # np.array copies, so callers never share objects with the cache
+        self._memory_cache[key] = np.array(embedding, dtype=np.float32)
+        self._memory_cache.move_to_end(key)
+        if len(self._memory_cache) > self.memory_cache_size:
+            self._memory_cache.popitem(last=False)
+
+    @abstractmethod
+    async def _embed(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for a list of texts using the underlying model."""
         pass
 
 
@@ -42,8 +136,14 @@ class VectorStore(ABC):
         source: str,
         model_name: str,
         metadatas: List[dict] = None,
-    ) -> None:
-        """Add embeddings and documents to the store."""
+        document_id: str = None,
+        start_index: int = 0,
+    ) -> str:
+        """Add embeddings and documents to the store, returning the document id.
+
+        Passing a previous call's document_id appends further chunks to the
+        same document, numbered from start_index.
+        """
         pass
 
     @abstractmethod
@@ -54,20 +154,36 @@ class VectorStore(ABC):
         pass
 
 
+DEFAULT_USER_PROMPT = (
+    "Use the following pieces of retrieved context to answer the question. "
+    "If you don't know the answer, just say that you don't know.\n"
+    "ONLY output the final answer. Do NOT repeat the question, the context, "
+    "or any part of this instruction.\n"
+    "Question: {query}\n"
+    "Context: {context}\n"
+    "Answer:"
+)
+
+
 class BaseLLM(ABC):
-    def __init__(self, model_name: str):
+    def __init__(self, model_name: str, user_prompt: str = DEFAULT_USER_PROMPT):
         self.system_prompt = "You are an assistant for question-answering tasks."
-        self.user_prompt = (
-            "Use the following pieces of retrieved context to answer the question. "
-            "If you don't know the answer, just say that you don't know.\n"
-            "ONLY output the final answer. Do NOT repeat the question, the context, "
-            "or any part of this instruction.\n"
-            "Question: {query}\n"
-            "Context: {context}\n"
-            "Answer:"
-        )
+        # Split the template once so prompts are built by concatenation
+        # instead of re-parsing the format string on every call
+        parts = user_prompt.split("{query}")
+        if len(parts) != 2 or parts[1].count("{context}") != 1 or "{context}" in parts[0]:
+            raise ValueError("user_prompt must contain {query} followed by {context}, once each.")
+        self._user_prompt = user_prompt
+        self._prompt_prefix = parts[0]
+        self._prompt_middle, self._prompt_suffix = parts[1].split("{context}")
         self.model_name = model_name
 
+    @property
+    def user_prompt(self) -> str:
+        """The prompt template. Pass a custom one to the constructor; it is
+        pre-split there, so it is read-only afterwards."""
+        return self._user_prompt
+
     @abstractmethod
     async def generate(self, query: str, context: str = "") -> str:
         """Generate a response based on query and optional context."""
@@ -1,40 +1,128 @@
 from typing import List
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import tiktoken
+import torch
 from openai import AsyncOpenAI
 from sentence_transformers import SentenceTransformer
-from src.rag.core.interfaces import EmbeddingModel
+from src.rag.core.interfaces import EmbeddingModel, EmbeddingCache, get_encoding
 from config.settings import Config
 
+# OpenAI caps a single embeddings request at 2048 inputs and 300k tokens.
+# The token budget is kept below the hard limit to absorb estimation error.
+MAX_BATCH_SIZE = 2048
+MAX_BATCH_TOKENS = 250_000
+
 
 class OpenAIEmbedder(EmbeddingModel):
     def __init__(
         self,
         model_name: str = Config.OPENAI_EMBEDDING_MODEL,
         dimensions: int = Config.EMBEDDING_DIMENSIONS,
+        max_concurrency: int = 4,
+        cache: EmbeddingCache = None,
     ):
-        super().__init__(model_name, dimensions)
+        super().__init__(model_name, dimensions, cache)
         self.client = AsyncOpenAI(api_key=Config.OPENAI_API_KEY)
+        # Budget with the tokenizer the API itself counts with (cl100k_base for
+        # text-embedding-3); a denser encoding would under-count.
+        try:
+            encoding_name = tiktoken.encoding_name_for_model(model_name)
+        except KeyError:
+            encoding_name = "cl100k_base"
+        self.encoding = get_encoding(encoding_name)
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        # A single embed() call needs max_concurrency full batches to keep every
+        # request slot busy; RAGPipeline sizes its ingest windows from these.
+        self.window_size = max_concurrency * MAX_BATCH_SIZE
+        self.window_tokens = max_concurrency * MAX_BATCH_TOKENS
+
+    def _make_batches(self, texts: List[str]) -> List[List[str]]:
+        # Greedily pack texts into batches under the per-request limits
+        token_counts = [len(tokens) for tokens in self.encoding.encode_ordinary_batch(texts)]
+        batches = []
+        batch = []
+        batch_tokens = 0
+
+        for text, n_tokens in zip(texts, token_counts):
+            if batch and (
+                len(batch) >= MAX_BATCH_SIZE or batch_tokens + n_tokens > MAX_BATCH_TOKENS
+            ):
+                batches.append(batch)
+                batch = []
+                batch_tokens = 0
+            batch.append(text)
+            batch_tokens += n_tokens
+
+        if batch:
+            batches.append(batch)
+        return batches
 
-    async def embed(self, texts: List[str]) -> List[List[float]]:
-        texts = [t.replace("\n", " ") for t in texts]
-        response = await self.client.embeddings.create(input=texts, model=self.model_name, dimensions=self.dimensions)
+    async def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        async with self.semaphore:
+            response = await self.client.embeddings.create(input=batch, model=self.model_name, dimensions=self.dimensions)
         return [data.embedding for data in response.data]
 
+    async def _embed(self, texts: List[str]) -> List[List[float]]:
+        # Only the legacy ada models were sensitive to newlines in the input
+        if self.model_name.startswith("text-embedding-ada"):
+            texts = [t.replace("\n", " ") for t in texts]
+        # Tokenizing for the budget is CPU-bound, so keep it off the event loop
+        loop = asyncio.get_running_loop()
+        batches = await loop.run_in_executor(None, self._make_batches, texts)
+        # gather preserves batch order, so flattening restores the input order
+        results = await asyncio.gather(*[self._embed_batch(batch) for batch in batches])
+        return [embedding for batch_embeddings in results for embedding in batch_embeddings]
+
 
 class HuggingFaceEmbedder(EmbeddingModel):
     def __init__(
         self,
         model_name: str = Config.HF_EMBEDDING_MODEL,
         dimensions: int = Config.EMBEDDING_DIMENSIONS,
+        cache: EmbeddingCache = None,
+        batch_size: int = 64,
+        backend: str = Config.HF_EMBEDDING_BACKEND,
+        onnx_file_name: str = Config.HF_EMBEDDING_ONNX_FILE,
     ):
-        super().__init__(model_name, dimensions)
+        super().__init__(model_name, dimensions, cache)
+        self.batch_size = batch_size
+        self.backend = backend
+        # Quantized or alternate runtimes and reduced precision produce different
+        # vectors for the same model, so they must not share cache entries
+        self.cache_key = f"{model_name}|backend={backend}"
+        if backend == "onnx" and onnx_file_name:
+            self.cache_key += f"|file={onnx_file_name}"
+        model_kwargs = {}
+        if backend == "torch":
+            # Half precision halves weight bandwidth on GPU. bfloat16 is used because
+            # some encoders (e.g. EmbeddingGemma) produce NaNs under float16.
+            if torch.cuda.is_available() and torch.cuda.is_bf16_supported():
+                model_kwargs["dtype"] = torch.bfloat16
+            self.cache_key += f"|dtype={model_kwargs.get('dtype', torch.float32)}"
+        elif backend == "onnx" and onnx_file_name:
+            # e.g. "onnx/model_qint8_avx512_vnni.onnx" for int8 VNNI kernels on CPU
+            model_kwargs["file_name"] = onnx_file_name
         # Initialize synchronously as SentenceTransformer is not async native
-        self.model = SentenceTransformer(model_name)
+        self.model = SentenceTransformer(
+            model_name, backend=backend, model_kwargs=model_kwargs
+        ).eval()
+        # A dedicated thread keeps all encode calls on one device context
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        with torch.inference_mode():
+            embeddings = self.model.encode(
+                texts,
+                batch_size=self.batch_size,
+                convert_to_tensor=True,
+                normalize_embeddings=True,
+                show_progress_bar=False,
+            )
+        return embeddings.float().cpu().tolist()
 
-    async def embed(self, texts: List[str]) -> List[List[float]]:
+    async def _embed(self, texts: List[str]) -> List[List[float]]:
         # Run blocking code in a thread
         loop = asyncio.get_running_loop()
-        embeddings = await loop.run_in_executor(
-            None, lambda: self.model.encode(texts, convert_to_numpy=True)
-        )
-        return embeddings.tolist()
+        return await loop.run_in_executor(self._executor, self._encode, texts)
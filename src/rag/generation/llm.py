@@ -1,23 +1,30 @@
 import asyncio
+import copy
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 from openai import AsyncOpenAI
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig, DynamicCache
 import torch
-from src.rag.core.interfaces import BaseLLM
+from src.rag.core.interfaces import BaseLLM, DEFAULT_USER_PROMPT
 from config.settings import Config
 
 
 class OpenAILLM(BaseLLM):
-    def __init__(self, model_name: str = Config.OPENAI_LLM_MODEL):
-        super().__init__(model_name)
+    def __init__(
+        self,
+        model_name: str = Config.OPENAI_LLM_MODEL,
+        user_prompt: str = DEFAULT_USER_PROMPT,
+    ):
+        super().__init__(model_name, user_prompt)
         self.client = AsyncOpenAI(api_key=Config.OPENAI_API_KEY)
 
     async def generate(self, query: str, context: str = "") -> str:
+        user_prompt = self._prompt_prefix + query + self._prompt_middle + context + self._prompt_suffix
         response = await self.client.responses.create(
             model=self.model_name,
             input=[
                 {"role": "system", "content": self.system_prompt},
-                {"role": "user", "content": self.user_prompt.format(query=query, context=context)},
+                {"role": "user", "content": user_prompt},
             ],
             temperature=0,
             max_output_tokens=512
@@ -26,28 +33,93 @@ class OpenAILLM(BaseLLM):
 
 
 class HuggingFaceLLM(BaseLLM):
-    def __init__(self, model_name: str = Config.HF_LLM_MODEL):
-        super().__init__(model_name)
-        self.pipe = pipeline(
-            "text-generation",
-            model=self.model_name,
-            dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-            device_map="auto",
-        )
+    def __init__(
+        self,
+        model_name: str = Config.HF_LLM_MODEL,
+        load_in_8bit: bool = False,
+        user_prompt: str = DEFAULT_USER_PROMPT,
+    ):
+        # The prompt prefix is prefilled into a KV cache below, so the
+        # template can only be set here
+        super().__init__(model_name, user_prompt)
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        # LLM.int8 trades speed for memory: it roughly halves VRAM but is usually
+        # slower than fp16 for small models, so it is opt-in. Its kernels are
+        # CUDA-only, so CPU always loads in fp32.
+        if torch.cuda.is_available():
+            model_kwargs = (
+                {"quantization_config": BitsAndBytesConfig(load_in_8bit=True)}
+                if load_in_8bit
+                else {"dtype": torch.float16}
+            )
+        else:
+            model_kwargs = {"dtype": torch.float32}
+        self.model = AutoModelForCausalLM.from_pretrained(
+            self.model_name, device_map="auto", **model_kwargs
+        ).eval()
+
+        # The system prompt and the template text before the query never change,
+        # so their KV cache is computed once and reused by every generate call.
+        # Trailing whitespace moves to the tail: BPE tokenizers merge it into the
+        # first query token, so cutting after it would not match full-prompt ids.
+        full_prefix = self.system_prompt + "\n" + self._prompt_prefix
+        self._prefix = full_prefix.rstrip()
+        self._tail_lead = full_prefix[len(self._prefix):]
+        self._prefix_ids = self.tokenizer(self._prefix, return_tensors="pt").input_ids.to(self.model.device)
+
+        # Verify once that prefix ids + separately tokenized tail reproduce the
+        # one-pass tokenization. Tokenizers that add e.g. a dummy prefix to
+        # the tail fail this and fall back to full-prompt prefill.
+        sample_tail = self._tail_lead + "What is this?" + self._prompt_middle + "Context." + self._prompt_suffix
+        full_ids = self.tokenizer(self._prefix + sample_tail).input_ids
+        split_ids = self._prefix_ids[0].tolist() + self.tokenizer(
+            sample_tail, add_special_tokens=False
+        ).input_ids
+        self._prefix_cache = None
+        if full_ids == split_ids:
+            with torch.inference_mode():
+                self._prefix_cache = self.model(
+                    input_ids=self._prefix_ids, past_key_values=DynamicCache(), use_cache=True
+                ).past_key_values
+        else:
+            print(f"Prefix caching disabled: {self.model_name} tokenizes the prompt differently when split.")
+
+        # A single worker serializes generation on the model's device instead of
+        # letting concurrent requests contend for it from the default pool
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def _generate(self, tail: str) -> str:
+        with torch.inference_mode():
+            if self._prefix_cache is not None:
+                tail_ids = self.tokenizer(
+                    tail, return_tensors="pt", add_special_tokens=False
+                ).input_ids.to(self.model.device)
+                input_ids = torch.cat([self._prefix_ids, tail_ids], dim=-1)
+                # generate extends the cache in place, so each call gets its own copy
+                past_key_values = copy.deepcopy(self._prefix_cache)
+            else:
+                input_ids = self.tokenizer(
+                    self._prefix + tail, return_tensors="pt"
+                ).input_ids.to(self.model.device)
+                past_key_values = None
+
+            output = self.model.generate(
+                input_ids=input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                past_key_values=past_key_values,
+                max_new_tokens=512,
+                do_sample=False,
+                temperature=None,
+                top_p=None,
+                top_k=None,
+                use_cache=True,
+            )
+        # Decode only the newly generated tokens
+        new_tokens = output[0, input_ids.shape[-1]:]
+        return self.tokenizer.decode(new_tokens, skip_special_tokens=True).strip()
 
     async def generate(self, query: str, context: str = "") -> str:
-        prompt = self.system_prompt + "\n" + self.user_prompt.format(query=query, context=context)
+        tail = self._tail_lead + query + self._prompt_middle + context + self._prompt_suffix
         # Run blocking generation in thread
         loop = asyncio.get_running_loop()
-        result = await loop.run_in_executor(
-            None,
-            lambda: self.pipe(
-                text_inputs=prompt, max_new_tokens=512, do_sample=True, temperature=0.1
-            ),
-        )
-        # We can either use do_sample=False and temperature=0.0 or do_sample=True and temperature>0.0
-        # If we use do_sample=True and temperature=0.0, it will throw an error
-        generated_text = result[0]["generated_text"]
-        if generated_text.startswith(prompt):
-            return generated_text[len(prompt):].strip()
-        return generated_text
+        return await loop.run_in_executor(self._executor, self._generate, tail)
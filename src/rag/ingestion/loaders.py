@@ -1,10 +1,10 @@
 import os
-from typing import List
+from typing import Iterator
 from pypdf import PdfReader
 from src.rag.core.interfaces import Document
 
 
-def load_text(path: str) -> List[Document]:
+def load_text(path: str) -> Iterator[Document]:
     with open(path, "r", encoding="utf-8") as f:
         content = f.read()
 
@@ -14,12 +14,12 @@ def load_text(path: str) -> List[Document]:
         "file_type": "text/plain",
         "file_size": file_stats.st_size,  # in bytes
     }
-    return [Document(content=content, metadata=metadata)]
+    yield Document(content=content, metadata=metadata)
 
 
-def load_pdf(path: str) -> List[Document]:
+def load_pdf(path: str) -> Iterator[Document]:
+    # Pages are extracted lazily, one at a time, as the caller iterates
     reader = PdfReader(path)
-    documents = []
     file_stats = os.stat(path)
     base_metadata = {
         "file_name": os.path.basename(path),
@@ -35,12 +35,10 @@ def load_pdf(path: str) -> List[Document]:
         if text:
             page_metadata = base_metadata.copy()
             page_metadata["page_number"] = i + 1
-            documents.append(Document(content=text, metadata=page_metadata))
+            yield Document(content=text, metadata=page_metadata)
 
-    return documents
 
-
-def load_document(path: str) -> List[Document]:
+def load_document(path: str) -> Iterator[Document]:
     ext = os.path.splitext(path)[1].lower()
     if ext == ".txt":
         return load_text(path)
@@ -1,5 +1,5 @@
 from typing import List, Dict, Any
-from src.rag.core.interfaces import ChunkingStrategy, EmbeddingModel, VectorStore, BaseLLM
+from src.rag.core.interfaces import ChunkingStrategy, EmbeddingModel, VectorStore, BaseLLM, Document
 from src.rag.ingestion.loaders import load_document
 from src.rag.retrieval.search import Retriever
 
@@ -11,12 +11,22 @@ class RAGPipeline:
         embedder: EmbeddingModel,
         vector_store: VectorStore,
         llm: BaseLLM,
+        ingest_window_size: int = None,
+        ingest_window_tokens: int = None,
     ):
         self.chunker = chunker
         self.embedder = embedder
         self.vector_store = vector_store
         self.llm = llm
         self.retriever = Retriever(vector_store, embedder)
+        # Ingestion holds at most this many chunks / tokens in memory at once.
+        # Windows are embedded one at a time, so a window no larger than one
+        # API request would leave the embedder's concurrency unused. The
+        # defaults follow the embedder's own window hint (for OpenAIEmbedder,
+        # max_concurrency x the per-request limits), so each window fans out
+        # into max_concurrency parallel requests.
+        self.ingest_window_size = ingest_window_size or getattr(embedder, "window_size", 2048)
+        self.ingest_window_tokens = ingest_window_tokens or getattr(embedder, "window_tokens", 200_000)
 
     async def ingest(self, file_path: str):
         import uuid
@@ -24,37 +34,71 @@ class RAGPipeline:
         job_id = str(uuid.uuid4())
         print(f"Starting ingestion job {job_id} for {file_path}...")
 
-        documents = load_document(file_path)
+        # Get model name from embedder
+        model_name = getattr(self.embedder, "model_name", "unknown")
 
-        # Add job_id to document metadata
-        for doc in documents:
-            doc.metadata["ingestion_job_id"] = job_id
+        # Documents are streamed from the loader and flushed to the store in
+        # windows, so memory stays bounded by the window instead of the file.
+        document_id = None
+        stored_chunks = 0
+        window: List[Document] = []
+        window_tokens = 0
 
         print("Chunking...")
-        all_chunks = []
-        for doc in documents:
-            chunks = self.chunker.chunk(doc)
-            all_chunks.extend(chunks)
+        for doc in load_document(file_path):
+            # Add job_id to document metadata
+            doc.metadata["ingestion_job_id"] = job_id
+
+            for chunk in self.chunker.chunk(doc):
+                window.append(chunk)
+                window_tokens += chunk.metadata.get("token_count", 0)
+
+                if (
+                    len(window) >= self.ingest_window_size
+                    or window_tokens >= self.ingest_window_tokens
+                ):
+                    document_id = await self._store_window(
+                        window, file_path, model_name, document_id, stored_chunks
+                    )
+                    stored_chunks += len(window)
+                    window = []
+                    window_tokens = 0
 
-        print(f"Embedding {len(all_chunks)} chunks...")
-        chunk_texts = [chunk.content for chunk in all_chunks]
+        if window:
+            await self._store_window(
+                window, file_path, model_name, document_id, stored_chunks
+            )
+            stored_chunks += len(window)
+
+        # Cached retrieval results do not include the new chunks
+        self.retriever.clear_cache()
+        print(f"Ingestion complete ({stored_chunks} chunks).")
+
+    async def _store_window(
+        self,
+        chunks: List[Document],
+        source: str,
+        model_name: str,
+        document_id: str,
+        start_index: int,
+    ) -> str:
+        print(f"Embedding {len(chunks)} chunks...")
+        chunk_texts = [chunk.content for chunk in chunks]
         embeddings = await self.embedder.embed(chunk_texts)
 
         print("Storing in Vector Store...")
         # Extract metadata from chunks
-        metadatas = [chunk.metadata for chunk in all_chunks]
-
-        # Get model name from embedder
-        model_name = getattr(self.embedder, "model_name", "unknown")
+        metadatas = [chunk.metadata for chunk in chunks]
 
-        await self.vector_store.add(
+        return await self.vector_store.add(
             embeddings,
             chunk_texts,
-            source=file_path,
+            source=source,
             model_name=model_name,
             metadatas=metadatas,
+            document_id=document_id,
+            start_index=start_index,
         )
-        print("Ingestion complete.")
 
     async def query(self, user_query: str, filters: Dict[str, Any] = None) -> str:
         print(f"Querying: {user_query}")
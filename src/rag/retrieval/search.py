@@ -1,15 +1,52 @@
-from typing import List, Dict, Any
+import json
+from collections import deque
+from typing import List, Dict, Any, Deque, Tuple
+import numpy as np
 from src.rag.core.interfaces import VectorStore, EmbeddingModel
 
 
 class Retriever:
-    def __init__(self, vector_store: VectorStore, embedder: EmbeddingModel):
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        embedder: EmbeddingModel,
+        cache_size: int = 256,
+        similarity_threshold: float = 0.97,
+    ):
         self.vector_store = vector_store
         self.embedder = embedder
+        self.similarity_threshold = similarity_threshold
+        # Recent (normalized query embedding, k, filters, results) entries.
+        # Query embeddings themselves are persisted by the embedder's cache.
+        self._cache: Deque[Tuple[np.ndarray, int, str, List[str]]] = deque(maxlen=cache_size)
+
+    def clear_cache(self) -> None:
+        self._cache.clear()
+
+    def _lookup(self, query_vector: np.ndarray, k: int, filters_key: str):
+        candidates = [entry for entry in self._cache if entry[1] == k and entry[2] == filters_key]
+        if not candidates:
+            return None
+        similarities = np.stack([entry[0] for entry in candidates]) @ query_vector
+        best = int(np.argmax(similarities))
+        if similarities[best] >= self.similarity_threshold:
+            return candidates[best][3]
+        return None
 
     async def retrieve(
         self, query: str, k: int = 5, filters: Dict[str, Any] = None
     ) -> List[str]:
         query_embedding = (await self.embedder.embed([query]))[0]
+
+        # Near-duplicate queries with the same k and filters reuse earlier results
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        query_vector = query_vector / (np.linalg.norm(query_vector) or 1.0)
+        filters_key = json.dumps(filters, sort_keys=True, default=str)
+        cached = self._lookup(query_vector, k, filters_key)
+        if cached is not None:
+            return list(cached)
+
         results = await self.vector_store.search(query_embedding, k=k, filters=filters)
+        # Store a copy so callers mutating the returned list cannot alter the cache
+        self._cache.append((query_vector, k, filters_key, list(results)))
         return results
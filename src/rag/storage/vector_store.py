@@ -1,24 +1,133 @@
 import asyncpg
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple, Literal
 import json
-from src.rag.core.interfaces import VectorStore
+import math
+import uuid
+import numpy as np
+from pgvector.asyncpg import register_vector
+from src.rag.core.interfaces import VectorStore, EmbeddingCache
 from config.settings import Config
 
+# Metadata keys that describe the source file rather than an individual chunk
+DOCUMENT_METADATA_KEYS = frozenset(
+    {
+        "file_name",
+        "file_type",
+        "file_size",
+        "author",
+        "tags",
+        "ingestion_job_id",
+    }
+)
 
-class PostgresVectorStore(VectorStore):
-    def __init__(self, db_url: str = Config.POSTGRES_DB_URL, dimension: int = Config.EMBEDDING_DIMENSIONS):
+# HNSW presets by expected row count: (max_rows, m, ef_construction, ef_search).
+# Larger graphs need more links and wider candidate lists to keep recall up.
+HNSW_PRESETS = [
+    (100_000, 16, 64, 40),
+    (1_000_000, 24, 100, 100),
+    (None, 32, 128, 200),
+]
+
+
+# Distance metric -> (pgvector operator class suffix, distance operator)
+DISTANCE_METRICS = {
+    "cosine": ("cosine", "<=>"),
+    "l2": ("l2", "<->"),
+    "inner_product": ("ip", "<#>"),
+}
+
+
+def _hnsw_preset(expected_rows: Optional[int]) -> Tuple[int, int, int]:
+    for max_rows, m, ef_construction, ef_search in HNSW_PRESETS:
+        if max_rows is None or (expected_rows or 0) < max_rows:
+            return m, ef_construction, ef_search
+
+
+def _ivfflat_preset(expected_rows: Optional[int]) -> Tuple[int, int]:
+    # pgvector guidance: rows / 1000 lists up to 1M rows, sqrt(rows) beyond,
+    # and sqrt(lists) probes at query time.
+    rows = expected_rows or 0
+    lists = max(rows // 1000 if rows <= 1_000_000 else int(math.sqrt(rows)), 1)
+    return lists, max(int(math.sqrt(lists)), 1)
+
+
+class PostgresVectorStore(VectorStore, EmbeddingCache):
+    def __init__(
+        self,
+        db_url: str = Config.POSTGRES_DB_URL,
+        dimension: int = Config.EMBEDDING_DIMENSIONS,
+        expected_rows: int = None,
+        index_type: Literal["hnsw", "ivfflat"] = "hnsw",
+        metric: Literal["cosine", "l2", "inner_product"] = "cosine",
+        hnsw_m: int = None,
+        hnsw_ef_construction: int = None,
+        hnsw_ef_search: int = None,
+        ivfflat_lists: int = None,
+        ivfflat_probes: int = None,
+        maintenance_work_mem: str = "2GB",
+        max_parallel_maintenance_workers: int = 7,
+    ):
         if not db_url:
             raise ValueError("Database URL is not configured.")
         self.db_url = db_url
         self.pool = None
         self.dimension = dimension
 
+        if index_type not in ("hnsw", "ivfflat"):
+            raise ValueError(f"Unsupported index type: {index_type}")
+        if metric not in DISTANCE_METRICS:
+            raise ValueError(f"Unsupported distance metric: {metric}")
+        self.index_type = index_type
+        self.metric = metric
+        ops_suffix, self.distance_operator = DISTANCE_METRICS[metric]
+        self.operator_class = f"halfvec_{ops_suffix}_ops"
+
+        # Explicit values win over the preset picked from the expected row count
+        m, ef_construction, ef_search = _hnsw_preset(expected_rows)
+        self.hnsw_m = hnsw_m or m
+        self.hnsw_ef_construction = hnsw_ef_construction or ef_construction
+        self.hnsw_ef_search = hnsw_ef_search or ef_search
+        lists, probes = _ivfflat_preset(expected_rows)
+        self.ivfflat_lists = ivfflat_lists or lists
+        self.ivfflat_probes = ivfflat_probes or probes
+        # Without either hint, IVFFlat is sized from the table at build time
+        self._size_ivfflat_from_table = not (ivfflat_lists or expected_rows)
+        self._explicit_ivfflat_probes = ivfflat_probes is not None
+        self.maintenance_work_mem = maintenance_work_mem
+        self.max_parallel_maintenance_workers = max_parallel_maintenance_workers
+
     async def connect(self):
         if not self.pool:
+            # The vector types must exist before pooled connections can
+            # register their binary codecs.
+            conn = await asyncpg.connect(self.db_url)
+            try:
+                await conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+            finally:
+                await conn.close()
+
             print("Creating asyncpg connection pool...")
-            self.pool = await asyncpg.create_pool(self.db_url)
+            # Session settings are applied at connection startup, so queries
+            # do not pay an extra SET round-trip. asyncpg already prepares and
+            # caches each distinct statement per connection.
+            server_settings = {}
+            if self.index_type == "hnsw":
+                server_settings["hnsw.ef_search"] = str(int(self.hnsw_ef_search))
+            self.pool = await asyncpg.create_pool(
+                self.db_url,
+                server_settings=server_settings,
+                init=self._init_connection,
+            )
             await self._init_db()
 
+    async def _init_connection(self, conn):
+        await register_vector(conn)
+        # ivfflat.probes follows the lists of the most recent build, so it is
+        # read from the instance when each connection opens rather than
+        # fixed once in server_settings.
+        if self.index_type == "ivfflat":
+            await conn.execute(f"SET ivfflat.probes = {int(self.ivfflat_probes)}")
+
     async def close(self):
         if self.pool:
             await self.pool.close()
@@ -27,8 +136,7 @@ class PostgresVectorStore(VectorStore):
 
     async def _init_db(self):
         async with self.pool.acquire() as conn:
-            # Enable extensions
-            await conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+            # Enable extensions (vector is created in connect())
             await conn.execute('CREATE EXTENSION IF NOT EXISTS "uuid-ossp"')
 
             # Create tables
@@ -63,7 +171,7 @@ class PostgresVectorStore(VectorStore):
                 CREATE TABLE IF NOT EXISTS embeddings (
                     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
                     chunk_id UUID NOT NULL REFERENCES chunks(id) ON DELETE CASCADE,
-                    embedding vector({self.dimension}),
+                    embedding halfvec({self.dimension}),
                     model TEXT,
                     created_at TIMESTAMPTZ DEFAULT NOW(),
                     updated_at TIMESTAMPTZ DEFAULT NOW(),
@@ -72,6 +180,37 @@ class PostgresVectorStore(VectorStore):
             """
             )
 
+            # Migrate embeddings created before the switch to half precision.
+            # The old index uses vector_cosine_ops and cannot survive the type change.
+            embedding_type = await conn.fetchval("""
+                SELECT format_type(atttypid, atttypmod)
+                FROM pg_attribute
+                WHERE attrelid = 'embeddings'::regclass AND attname = 'embedding'
+            """
+            )
+            if embedding_type and embedding_type.startswith("vector"):
+                print("Migrating embeddings column to halfvec...")
+                async with conn.transaction():
+                    await conn.execute("DROP INDEX IF EXISTS idx_embeddings_hnsw")
+                    await conn.execute(f"""
+                        ALTER TABLE embeddings
+                        ALTER COLUMN embedding TYPE halfvec({self.dimension})
+                        USING embedding::halfvec({self.dimension})
+                    """
+                    )
+
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    hash BYTEA NOT NULL,
+                    model TEXT NOT NULL,
+                    dim INTEGER NOT NULL,
+                    embedding vector NOT NULL,
+                    created_at TIMESTAMPTZ DEFAULT NOW(),
+                    PRIMARY KEY (hash, model, dim)
+                );
+            """
+            )
+
             # Trigger function
             await conn.execute("""
                 CREATE OR REPLACE FUNCTION set_updated_at()
@@ -110,15 +249,95 @@ class PostgresVectorStore(VectorStore):
             """
             )
 
-            # Create Index
             await conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_embeddings_hnsw 
+                CREATE INDEX IF NOT EXISTS idx_documents_meta_gin
+                ON documents
+                USING gin (metadata jsonb_path_ops);
+            """
+            )
+
+            # Create Index
+            # Indexes left over from another index_type/metric would still be
+            # maintained on every insert, so only the configured one is kept.
+            await self._drop_stale_indexes(conn)
+
+            # IVFFlat trains its lists on existing rows; built on an empty table
+            # it gives poor recall, so defer it until there is data.
+            has_rows = await conn.fetchval("SELECT EXISTS (SELECT 1 FROM embeddings)")
+            if self.index_type == "ivfflat" and not has_rows:
+                print("Deferring IVFFlat index until data is loaded; call rebuild_index() after ingestion.")
+            else:
+                await self._create_index(conn)
+
+    async def rebuild_index(self):
+        """Drop and rebuild the vector index, e.g. after a bulk load."""
+        if not self.pool:
+            await self.connect()
+
+        async with self.pool.acquire() as conn:
+            await self._drop_stale_indexes(conn)
+            await self._create_index(conn, replace=True)
+
+    async def _drop_stale_indexes(self, conn):
+        index_names = await conn.fetch("""
+            SELECT DISTINCT i.relname AS name
+            FROM pg_index x
+            JOIN pg_class i ON i.oid = x.indexrelid
+            JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = ANY(x.indkey)
+            WHERE x.indrelid = 'embeddings'::regclass AND a.attname = 'embedding'
+        """
+        )
+        for row in index_names:
+            name = row["name"]
+            if name.startswith("idx_embeddings_") and name != self._index_name():
+                print(f"Dropping stale vector index {name}...")
+                await conn.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+    def _index_name(self) -> str:
+        # Cosine keeps the original index names; other metrics get their own
+        index_name = f"idx_embeddings_{self.index_type}"
+        if self.metric != "cosine":
+            index_name += f"_{self.metric}"
+        return index_name
+
+    async def _create_index(self, conn, replace: bool = False):
+        if self.index_type == "hnsw":
+            options = f"m = {int(self.hnsw_m)}, ef_construction = {int(self.hnsw_ef_construction)}"
+        else:
+            # IVFFlat builds much faster than HNSW, which suits bulk re-ingest.
+            # Its lists are trained on the rows present at build time, so call
+            # rebuild_index() once the data is loaded.
+            if self._size_ivfflat_from_table:
+                rows = await conn.fetchval("SELECT count(*) FROM embeddings")
+                lists, probes = _ivfflat_preset(rows)
+                self.ivfflat_lists = lists
+                if not self._explicit_ivfflat_probes:
+                    self.ivfflat_probes = probes
+            options = f"lists = {int(self.ivfflat_lists)}"
+
+        # Build settings are scoped to this transaction to avoid leaking
+        # into the pooled connection.
+        async with conn.transaction():
+            if replace:
+                await conn.execute(f"DROP INDEX IF EXISTS {self._index_name()}")
+            await conn.execute(
+                f"SET LOCAL maintenance_work_mem = '{self.maintenance_work_mem}'"
+            )
+            await conn.execute(
+                f"SET LOCAL max_parallel_maintenance_workers = {int(self.max_parallel_maintenance_workers)}"
+            )
+            await conn.execute(f"""
+                CREATE INDEX IF NOT EXISTS {self._index_name()} 
                 ON embeddings 
-                USING hnsw (embedding vector_cosine_ops) 
-                WITH (m = 16, ef_construction = 64);
+                USING {self.index_type} (embedding {self.operator_class}) 
+                WITH ({options});
             """
             )
 
+        if self.index_type == "ivfflat":
+            # Reopen pooled connections so they pick up the new probes
+            await self.pool.expire_connections()
+
     async def add(
         self,
         embeddings: List[List[float]],
@@ -126,65 +345,107 @@ class PostgresVectorStore(VectorStore):
         source: str,
         model_name: str,
         metadatas: List[Dict[str, Any]] = None,
-    ) -> None:
+        document_id: str = None,
+        start_index: int = 0,
+    ) -> str:
         if not self.pool:
             await self.connect()
 
         if metadatas is None:
             metadatas = [{} for _ in documents]
 
+        # Extract document-level metadata from the first chunk's metadata.
+        representative_meta = metadatas[0] if metadatas else {}
+        doc_metadata = {
+            k: v for k, v in representative_meta.items() if k in DOCUMENT_METADATA_KEYS
+        }
+
+        # Prepare all rows up front; ids are generated client-side so chunks
+        # and embeddings can reference them without RETURNING.
+        doc_id = uuid.UUID(str(document_id)) if document_id else uuid.uuid4()
+        chunk_ids = [uuid.uuid4() for _ in documents]
+        chunk_metas_json = [
+            json.dumps({k: v for k, v in m.items() if k not in DOCUMENT_METADATA_KEYS})
+            for m in metadatas
+        ]
+        chunk_records = [
+            (chunk_id, doc_id, i, doc_content, meta_json)
+            for i, (chunk_id, doc_content, meta_json) in enumerate(
+                zip(chunk_ids, documents, chunk_metas_json), start=start_index
+            )
+        ]
+        embedding_records = [
+            (chunk_id, np.asarray(emb, dtype=np.float32), model_name)
+            for chunk_id, emb in zip(chunk_ids, embeddings)
+        ]
+
         async with self.pool.acquire() as conn:
             async with conn.transaction():
-                # 1. Insert Document
-                # Extract document-level metadata from the first chunk's metadata.
-                representative_meta = metadatas[0] if metadatas else {}
-
-                # Define keys that belong to the document level
-                doc_keys = {
-                    "file_name",
-                    "file_type",
-                    "file_size",
-                    "author",
-                    "tags",
-                    "ingestion_job_id",
-                }
+                # 1. Insert Document (skipped when appending to an existing one)
+                if not document_id:
+                    await conn.execute(
+                        "INSERT INTO documents (id, source_path, metadata) VALUES ($1, $2, $3)",
+                        doc_id,
+                        source,
+                        json.dumps(doc_metadata),
+                    )
 
-                doc_metadata = {
-                    k: v for k, v in representative_meta.items() if k in doc_keys
-                }
+                # 2. Insert Chunks and Embeddings
+                await conn.copy_records_to_table(
+                    "chunks",
+                    records=chunk_records,
+                    columns=["id", "document_id", "chunk_index", "content", "metadata"],
+                )
 
-                doc_id = await conn.fetchval(
-                    "INSERT INTO documents (source_path, metadata) VALUES ($1, $2) RETURNING id",
-                    source,
-                    json.dumps(doc_metadata),
+                # Vectors are sent in pgvector's binary format via the codec
+                # registered on each pooled connection.
+                await conn.copy_records_to_table(
+                    "embeddings",
+                    records=embedding_records,
+                    columns=["chunk_id", "embedding", "model"],
                 )
 
-                # 2. Insert Chunks and Embeddings
-                for i, (doc_content, full_meta, emb) in enumerate(
-                    zip(documents, metadatas, embeddings)
-                ):
-                    # Filter out document-level keys for the chunk metadata
-                    chunk_metadata = {
-                        k: v for k, v in full_meta.items() if k not in doc_keys
-                    }
-
-                    chunk_id = await conn.fetchval("""
-                        INSERT INTO chunks (document_id, chunk_index, content, metadata)
-                        VALUES ($1, $2, $3, $4) RETURNING id
-                    """,
-                        doc_id,
-                        i,
-                        doc_content,
-                        json.dumps(chunk_metadata),
-                    )
+        return str(doc_id)
 
-                    emb_str = "[" + ",".join(f"{x:.8f}" for x in emb) + "]"
-                    await conn.execute(
-                        "INSERT INTO embeddings (chunk_id, embedding, model) VALUES ($1, $2, $3)",
-                        chunk_id,
-                        emb_str,
-                        model_name,
-                    )
+    async def get_embeddings(
+        self, hashes: List[bytes], model_name: str, dimensions: int
+    ) -> Dict[bytes, List[float]]:
+        if not self.pool:
+            await self.connect()
+
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch("""
+                SELECT hash, embedding
+                FROM embedding_cache
+                WHERE model = $1 AND dim = $2 AND hash = ANY($3::bytea[])
+            """,
+                model_name,
+                dimensions,
+                hashes,
+            )
+        return {bytes(row["hash"]): row["embedding"].tolist() for row in rows}
+
+    async def put_embeddings(
+        self,
+        hashes: List[bytes],
+        embeddings: List[List[float]],
+        model_name: str,
+        dimensions: int,
+    ) -> None:
+        if not self.pool:
+            await self.connect()
+
+        async with self.pool.acquire() as conn:
+            await conn.executemany("""
+                INSERT INTO embedding_cache (hash, model, dim, embedding)
+                VALUES ($1, $2, $3, $4)
+                ON CONFLICT DO NOTHING
+            """,
+                [
+                    (h, model_name, dimensions, np.asarray(emb, dtype=np.float32))
+                    for h, emb in zip(hashes, embeddings)
+                ],
+            )
 
     async def search(
         self, query_embedding: List[float], k: int = 5, filters: Dict[str, Any] = None
@@ -193,34 +454,39 @@ class PostgresVectorStore(VectorStore):
             await self.connect()
         
         async with self.pool.acquire() as conn:
-            await conn.execute("SET hnsw.ef_search = 40")
-
             search_query = """
                 SELECT c.content 
                 FROM embeddings e
                 JOIN chunks c ON e.chunk_id = c.id
-                JOIN documents d ON c.document_id = d.id
             """
 
-            params = [str(query_embedding), k]
+            params = [np.asarray(query_embedding, dtype=np.float32), k]
             where_clauses = []
             param_index = 3
 
             if filters:
-                for key, value in filters.items():
-                    if key == "source_path":
-                        where_clauses.append(f"d.source_path = ${param_index}")
-                        params.append(value)
-                        param_index += 1
-                    else:
-                        where_clauses.append(f"d.metadata->>'{key}' = ${param_index}")
-                        params.append(str(value))
-                        param_index += 1
+                if "source_path" in filters:
+                    where_clauses.append(f"d.source_path = ${param_index}")
+                    params.append(filters["source_path"])
+                    param_index += 1
+
+                # A single containment predicate keeps the query text stable
+                # across filter keys and can use the GIN index on metadata.
+                metadata_filter = {
+                    k: v for k, v in filters.items() if k != "source_path"
+                }
+                if metadata_filter:
+                    where_clauses.append(f"d.metadata @> ${param_index}::jsonb")
+                    params.append(json.dumps(metadata_filter))
+                    param_index += 1
 
+            # Every filter is document-level, so unfiltered searches skip the join.
+            # This leaves four fixed query shapes, each cached as a prepared statement.
             if where_clauses:
+                search_query += " JOIN documents d ON c.document_id = d.id"
                 search_query += " WHERE " + " AND ".join(where_clauses)
 
-            search_query += " ORDER BY e.embedding <=> $1 LIMIT $2"
+            search_query += f" ORDER BY e.embedding {self.distance_operator} $1::halfvec LIMIT $2"
 
             rows = await conn.fetch(search_query, *params)
             return [row["content"] for row in rows]